@@ -1,3 +1,5 @@
+import math
+import struct
 import traceback
 import typing
 from typing import Optional, Dict, List, Set, Callable, Tuple, Any
@@ -5,6 +7,9 @@ from copy import copy
 from enum import Enum
 from datetime import datetime
 
+import numpy as np
+from scipy.special import ndtr
+
 from vnpy.event import Event, EventEngine
 from vnpy.trader.event import (
     EVENT_TIMER, EVENT_ORDER
@@ -24,6 +29,11 @@ from vnpy.app.option_master.base import (
     OptionData, PortfolioData, UnderlyingData, ChainData
 )
 
+try:
+    from .kernel import calculate_pos_delta as calculate_pos_delta_kernel
+except ImportError:
+    calculate_pos_delta_kernel = None
+
 APP_NAME = "OptionMasterExt"
 
 EVENT_OPTION_STRATEGY_ORDER = "eOptionStrategyOrder"
@@ -42,6 +52,44 @@ STRATEGY_STRANGLE_SHORT_TWO = "strangle_short_2"
 STRATEGY_STRANGLE_LONG_THREE = "strangle_long_3"
 STRATEGY_STRANGLE_SHORT_THREE = "strangle_short_3"
 
+ANNUAL_DAYS = 240
+KERNEL_MIN_OPTIONS = 1000
+SIGN_MASK = 1 << 63
+SQRT_2PI = np.sqrt(2 * np.pi)
+
+MODEL_BLACK_76 = "black_76"
+MODEL_BLACK_SCHOLES = "black_scholes"
+
+
+def get_pricing_model(option: OptionData) -> str:
+    """
+    Get name of closed-form pricing model bound to option, empty if none.
+    """
+    module = getattr(option.calculate_greeks, "__module__", None) or ""
+    for model in [MODEL_BLACK_76, MODEL_BLACK_SCHOLES]:
+        if model in module:
+            return model
+    return ""
+
+
+def float_to_ordered_int(value: float) -> int:
+    """
+    Map float64 to int64 with the same ordering.
+    """
+    i = struct.unpack("<q", struct.pack("<d", value))[0]
+    if i < 0:
+        i = -i - SIGN_MASK
+    return i
+
+
+def ordered_int_to_float(i: int) -> float:
+    """
+    Inverse of float_to_ordered_int.
+    """
+    if i < 0:
+        i = -i - SIGN_MASK
+    return struct.unpack("<d", struct.pack("<q", i))[0]
+
 
 class OptionStrategy(Enum):
     CALL = "认购"
@@ -221,8 +269,26 @@ class OptionEngineExt(OptionEngine):
             chain_symbol = instrument.chain.chain_symbol
             algo = self.hedge_engine.hedge_algos.get(chain_symbol)
             if algo:
+                algo.pos_changed = True
                 algo.calculate_balance_price()
 
+    def process_position_event(self, event: Event) -> None:
+        position = event.data
+        instrument = self.instruments.get(position.vt_symbol, None)
+        net_pos = instrument.net_pos if instrument else 0
+
+        super().process_position_event(event)
+
+        if not self.hedge_engine.inited:
+            return
+
+        # positions are queried periodically, only flag rebuild when net pos changes
+        if isinstance(instrument, OptionData) and instrument.net_pos != net_pos:
+            chain_symbol = instrument.chain.chain_symbol
+            algo = self.hedge_engine.hedge_algos.get(chain_symbol)
+            if algo:
+                algo.pos_changed = True
+
 
 class StrategyTrading():
 
@@ -511,23 +577,27 @@ class HedgeEngine:
         self.calc_balance_trigger: int = 300
         self.offset_percent: float = 0.0
         self.hedge_percent: float = 0.0
+        self.debug: bool = False
+        self.log_interval: int = 60
 
         # variables
         self.inited = False
 
         self.chains: Dict[str, ChainData] = {}
         self.hedge_algos: Dict[str, "ChannelHedgeAlgo"] = {}
-        self.counters: Dict[str, float] = {}
+        self.check_delta_count: int = 0
+        self.calc_balance_count: int = 0
         self.data: Dict[str, Dict] = {}
         self.settings: Dict[str, Dict] = {}
+        self.status_snapshots: Dict[str, Tuple] = {}
+        self.log_times: Dict[str, datetime] = {}
 
     def load_setting(self) -> None:
         settings = load_json(self.setting_filename)
         for algo in self.hedge_algos.values():
             algo_setting = settings.get(algo.chain_symbol)
             if algo_setting:
-                algo.offset_percent = algo_setting['offset_percent']
-                algo.hedge_percent = algo_setting['hedge_percent']
+                algo.update_parameters(algo_setting)
                 self.put_hedge_algo_status_event(algo)
         self.settings = settings
         self.write_log(f"期权对冲引擎配置载入成功")
@@ -565,8 +635,8 @@ class HedgeEngine:
 
 
     def init_counter(self) -> None:
-        self.counters['check_delta'] = 0
-        self.counters['calculate_balance'] = 0
+        self.check_delta_count = 0
+        self.calc_balance_count = 0
 
     def init_chains(self) -> None:
         for portfolio in self.option_engine.active_portfolios.values():
@@ -627,24 +697,39 @@ class HedgeEngine:
 
     def process_timer_event(self, event: Event) -> None:
         try:
-            if self.counters['check_delta'] > self.check_delta_trigger:
+            self.check_delta_count += 1
+            if self.check_delta_count > self.check_delta_trigger:
+                self.check_delta_count = 0
                 self.auto_hedge()
-                self.counters['check_delta'] = 0
 
-            if self.counters['calculate_balance'] > self.calc_balance_trigger:
+            self.calc_balance_count += 1
+            if self.calc_balance_count > self.calc_balance_trigger:
+                self.calc_balance_count = 0
                 self.calc_all_balance()
-                self.counters['calculate_balance'] = 0
-
-            self.counters['check_delta'] += 1
-            self.counters['calculate_balance'] += 1
         except:
             msg = f"处理委托事件，触发异常：\n{traceback.format_exc()}"
             self.write_log(msg)
 
     def auto_hedge(self) -> None:
+        algos = []
         for algo in self.hedge_algos.values():
-            self.put_hedge_algo_status_event(algo)
-            algo.check_hedge_signal()
+            self.put_status_change_event(algo)
+            if algo.is_hedge_inited() and algo.underlying.tick:
+                algos.append(algo)
+
+        if not algos:
+            return
+
+        # compare all chains against their thresholds at once
+        prices = np.array([algo.underlying.tick.last_price for algo in algos])
+        up_prices = np.array([algo.up_price for algo in algos])
+        down_prices = np.array([algo.down_price for algo in algos])
+
+        for i in np.nonzero(prices > up_prices)[0]:
+            algos[i].action_hedge(Direction.LONG)
+
+        for i in np.nonzero(prices < down_prices)[0]:
+            algos[i].action_hedge(Direction.SHORT)
 
     def calc_all_balance(self) -> None:
         for algo in self.hedge_algos.values():
@@ -652,15 +737,44 @@ class HedgeEngine:
                 continue
             algo.calculate_balance_price()
 
+    def put_status_change_event(self, algo: "ChannelHedgeAlgo") -> None:
+        """
+        Put status event only if displayed status of algo has changed.
+        """
+        snapshot = algo.get_status_snapshot()
+        if snapshot == self.status_snapshots.get(algo.chain_symbol):
+            return
+
+        self.put_hedge_algo_status_event(algo)
+
     def put_hedge_algo_status_event(self, algo: "ChannelHedgeAlgo") -> None:
+        self.status_snapshots[algo.chain_symbol] = algo.get_status_snapshot()
+
         event = Event(EVENT_OPTION_HEDGE_ALGO_STATUS, algo)
         self.event_engine.put(event)
 
-    def write_log(self, msg: str):
+    def write_log(self, msg: str, throttle: bool = False):
+        """
+        Put log event, repeated message is dropped within log interval if throttle.
+        """
+        if throttle:
+            now = datetime.now()
+            last_time = self.log_times.get(msg)
+            if last_time and (now - last_time).total_seconds() < self.log_interval:
+                return
+            self.log_times[msg] = now
+
         log = LogData(APP_NAME, msg)
         event = Event(EVENT_OPTION_HEDGE_ALGO_LOG, log)
         self.event_engine.put(event)
 
+    def write_debug(self, msg_func: Callable[[], str]) -> None:
+        """
+        Message is only generated when debug is enabled.
+        """
+        if self.debug:
+            self.write_log(msg_func(), throttle=True)
+
 class ChannelHedgeAlgo:
 
     def __init__(self, chain_symbol: str, chain: ChainData, hedge_engine: HedgeEngine):
@@ -676,7 +790,24 @@ class ChannelHedgeAlgo:
         self.hedge_percent: float = 0.0
         self.send_at_break = True
 
+        self.up_factor: float = 1.0
+        self.down_factor: float = 1.0
+
+        # balance price search
+        self.bracket_step: float = 0.003
+        self.max_expand: int = 20
+        self.max_bisect: int = 20
+        self.price_tolerance: float = 0.00001
+
         # variables
+        self.pos_options: List[OptionData] = []
+        self.pos_arrays: Dict[str, np.ndarray] = {}
+        self.pos_changed: bool = True
+        self.pricing_model: str = ""
+
+        self.atm_index: str = ""
+        self.atm_options: Optional[Tuple[OptionData, OptionData]] = None
+
         self.strategy_orders: Dict[str, OptionStrategyOrder] = {}
         self.active_strategyids: Set[str] = set()
 
@@ -692,6 +823,7 @@ class ChannelHedgeAlgo:
         self.hedge_ref: int = 0
 
         self.write_log = self.hedge_engine.write_log
+        self.write_debug = self.hedge_engine.write_debug
         self.parameters = ['offset_percent', 'hedge_percent']
 
     def is_hedging(self) -> bool:
@@ -700,91 +832,369 @@ class ChannelHedgeAlgo:
     def is_active(self) -> bool:
         return self.status == HedgeStatus.RUNNING or self.status == HedgeStatus.HEDGING
 
+    def get_status_snapshot(self) -> Tuple:
+        # compare pos delta rounded the same way as monitor displays it
+        pos_delta = round(self.chain.pos_delta)
+
+        return (
+            self.status,
+            self.balance_price,
+            self.up_price,
+            self.down_price,
+            self.offset_percent,
+            self.hedge_percent,
+            self.chain.net_pos,
+            pos_delta,
+        )
+
     def get_synthesis_atm(self) -> Tuple[OptionData, OptionData]:
+        """
+        Get atm call and put, resolved again only when atm index changes.
+        """
         chain = self.chain
-        print('get synthesis atm', chain.atm_index)
-        atm_call = chain.calls[chain.atm_index]
-        atm_put = chain.puts[chain.atm_index]
-        return atm_call, atm_put
+        if chain.atm_index != self.atm_index:
+            self.atm_index = chain.atm_index
+            self.atm_options = (
+                chain.calls[chain.atm_index],
+                chain.puts[chain.atm_index]
+            )
+        return self.atm_options
 
-    def calculate_hedge_volume(self) -> int:
-        atm_call, atm_put = self.get_synthesis_atm()
+    def calculate_hedge_volume(self, atm_call: OptionData, atm_put: OptionData) -> int:
         unit_hedge_delta = abs(atm_call.cash_delta) + abs(atm_put.cash_delta)
-        print('calculate hedge volume', unit_hedge_delta)
+        self.write_debug(lambda: f"期权链{self.chain_symbol}单位对冲Delta：{unit_hedge_delta}")
         if not unit_hedge_delta:
             return
         to_hedge_volume = abs(self.chain.pos_delta) * self.hedge_percent / unit_hedge_delta
         return round(to_hedge_volume)
 
+    def update_pos_arrays(self) -> None:
+        """
+        Cache parameters of options with net pos as arrays.
+        """
+        options = [option for option in self.chain.options.values() if option.net_pos]
+        self.pos_options = options
+
+        if options:
+            self.pricing_model = get_pricing_model(options[0])
+        else:
+            self.pricing_model = ""
+
+        r = np.array([option.interest_rate for option in options], dtype=float)
+        t = np.array([option.time_to_expiry for option in options], dtype=float)
+        pos_size = np.array([option.size * option.net_pos for option in options], dtype=float)
+
+        # cost of carry is r for Black-Scholes and 0 for Black-76
+        if self.pricing_model == MODEL_BLACK_76:
+            carry = np.zeros(len(options))
+        else:
+            carry = r.copy()
+        carry_discount = np.exp((carry - r) * t)
+
+        self.pos_arrays = {
+            "strike_price": np.array([option.strike_price for option in options], dtype=float),
+            "interest_rate": r,
+            "time_to_expiry": t,
+            "option_type": np.array([option.option_type for option in options], dtype=float),
+            "impv": np.zeros(len(options)),
+            "carry": carry,
+            "carry_discount": carry_discount,
+            "pos_size": pos_size,
+            "delta_size": pos_size * carry_discount,
+        }
+        self.pos_changed = False
+
+    def update_impv_array(self) -> bool:
+        """
+        Refresh implied volatility of options with net pos.
+        """
+        if self.pos_changed:
+            self.update_pos_arrays()
+
+        impv = self.pos_arrays["impv"]
+        for i, option in enumerate(self.pos_options):
+            if not option.mid_impv:
+                self.write_log(f"期权{option.vt_symbol}隐含波动率尚未计算", throttle=True)
+                return False
+            impv[i] = option.mid_impv
+        return True
+
+    def calculate_d1(self, price: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate d1 and sqrt(t) of cached options at specific price.
+        """
+        arrays = self.pos_arrays
+        k = arrays["strike_price"]
+        b = arrays["carry"]
+        t = arrays["time_to_expiry"]
+        v = arrays["impv"]
+
+        sqrt_t = np.sqrt(t)
+        d1 = (np.log(price / k) + (b + 0.5 * v * v) * t) / (v * sqrt_t)
+        return d1, sqrt_t
+
     def calculate_pos_delta(self, price: float) -> float:
         """
-        Calculate pos delta at specific price.
+        Calculate pos delta at specific price with cached arrays.
+        """
+        if not self.pricing_model:
+            return self.calculate_pos_delta_by_model(price)
+
+        arrays = self.pos_arrays
+        cp = arrays["option_type"]
+
+        if calculate_pos_delta_kernel and len(self.pos_options) > KERNEL_MIN_OPTIONS:
+            return calculate_pos_delta_kernel(
+                price,
+                arrays["strike_price"],
+                arrays["carry"],
+                arrays["time_to_expiry"],
+                arrays["impv"],
+                cp,
+                arrays["delta_size"]
+            )
+
+        d1, _sqrt_t = self.calculate_d1(price)
+
+        # evaluate cdf over the whole array in place, reusing d1 buffer
+        d1 *= cp
+        delta = ndtr(d1, out=d1)
+        delta *= cp
+        return float(np.dot(delta, arrays["delta_size"])) * price * 0.01
+
+    def calculate_pos_delta_by_model(self, price: float) -> float:
+        """
+        Calculate pos delta option by option with the portfolio pricing model,
+        used when the model has no vectorized form (e.g. binomial tree).
         """
         chain_delta = 0
-        for option in self.chain.options.values():
-            if option.net_pos:
-                if not option.mid_impv:
-                    print(f'{option.vt_symbol} mid-impv is not')
-                    return
-
-                _price, delta, _gamma, _theta, _vega = option.calculate_greeks(
-                    price,
-                    option.strike_price,
-                    option.interest_rate,
-                    option.time_to_expiry,
-                    option.mid_impv,
-                    option.option_type
-                )
-                delta = delta * option.size * option.net_pos
-                chain_delta += delta
+        for option, impv in zip(self.pos_options, self.pos_arrays["impv"]):
+            _price, delta, _gamma, _theta, _vega = option.calculate_greeks(
+                price,
+                option.strike_price,
+                option.interest_rate,
+                option.time_to_expiry,
+                float(impv),
+                option.option_type
+            )
+            chain_delta += delta * option.size * option.net_pos
         return chain_delta
 
-    def calculate_balance_price(self) -> float:
+    def calculate_pos_greeks(self, price: float) -> Optional[Dict[str, float]]:
         """
-        Search balcance price by bisection method.
+        Calculate all pos greeks at specific price from shared d1/d2.
+        Return None if implied volatility is not ready.
         """
-        if not self.chain.net_pos:
+        if not self.update_impv_array():
             return
 
-        left_end = 0
-        right_end = 0
-        pricetick = self.underlying.pricetick
-        try_price = self.underlying.mid_price
+        if not self.pricing_model:
+            return self.calculate_pos_greeks_by_model(price)
+
+        arrays = self.pos_arrays
+        k = arrays["strike_price"]
+        r = arrays["interest_rate"]
+        b = arrays["carry"]
+        t = arrays["time_to_expiry"]
+        v = arrays["impv"]
+        cp = arrays["option_type"]
+        pos = arrays["pos_size"]
+        discount_s = price * arrays["carry_discount"]
+
+        d1, sqrt_t = self.calculate_d1(price)
+        d2 = d1 - v * sqrt_t
+        cdf1 = ndtr(cp * d1)
+        cdf2 = ndtr(cp * d2)
+        pdf1 = np.exp(-0.5 * d1 * d1) / SQRT_2PI
+        discount_k = k * np.exp(-r * t)
+
+        _price = cp * (discount_s * cdf1 - discount_k * cdf2)
+        _delta = cp * discount_s * cdf1 / price
+        _gamma = discount_s * pdf1 / (price * price * v * sqrt_t)
+        _theta = (
+            -discount_s * pdf1 * v / (2 * sqrt_t)
+            - cp * (b - r) * discount_s * cdf1
+            - cp * r * discount_k * cdf2
+        )
+        _vega = discount_s * pdf1 * sqrt_t
+
+        greeks = {
+            "price": float(np.dot(_price, pos)),
+            "delta": float(np.dot(_delta, pos)) * price * 0.01,
+            "gamma": float(np.dot(_gamma, pos)) * price * price * 0.0001,
+            "theta": float(np.dot(_theta, pos)) / ANNUAL_DAYS,
+            "vega": float(np.dot(_vega, pos)) / 100,
+        }
+        return greeks
+
+    def calculate_pos_greeks_by_model(self, price: float) -> Dict[str, float]:
+        """
+        Calculate all pos greeks option by option with the portfolio pricing model.
+        """
+        names = ["price", "delta", "gamma", "theta", "vega"]
+        greeks = dict.fromkeys(names, 0)
+
+        for option, impv in zip(self.pos_options, self.pos_arrays["impv"]):
+            values = option.calculate_greeks(
+                price,
+                option.strike_price,
+                option.interest_rate,
+                option.time_to_expiry,
+                float(impv),
+                option.option_type
+            )
+            pos = option.size * option.net_pos
+            for name, value in zip(names, values):
+                greeks[name] += value * pos
+        return greeks
+
+    def search_bracket(self, price: float, delta: float) -> Optional[Tuple[float, float, float]]:
+        """
+        Expand step around price until pos delta changes sign.
+        Return (left_end, right_end, left_delta) of the bracket.
+        """
+        step = price * self.bracket_step
 
-        while True:
-            try_delta = self.calculate_pos_delta(try_price)
-            if not try_delta:
-                return
+        for _ in range(self.max_expand):
+            up_price = price + step
+            up_delta = self.calculate_pos_delta(up_price)
+            if (up_delta > 0) != (delta > 0):
+                return price, up_price, delta
 
-            if try_delta > 0:
-                left_end = try_price
-                # if right boudary is uncentain
-                if right_end == 0 or try_price == right_end:
-                    right_end = try_price * 1.05
-                    try_price = right_end
-                else:
-                    try_price = (left_end + right_end) / 2
-            elif try_delta < 0:
-                right_end = try_price
-                # if left boundary is uncertain
-                if left_end == 0 or try_price == left_end:
-                    left_end = try_price * 0.95
-                    try_price = left_end
-                else:
-                    try_price = (left_end + right_end) / 2
+            down_price = price - step
+            if down_price > 0:
+                down_delta = self.calculate_pos_delta(down_price)
+                if (down_delta > 0) != (delta > 0):
+                    return down_price, price, down_delta
+
+            step *= 2
+
+    def bisect_balance_price(
+        self,
+        left_end: float,
+        right_end: float,
+        left_delta: float,
+        tolerance: float
+    ) -> float:
+        """
+        Narrow bracket by bisection until it is smaller than tolerance.
+        """
+        # bracket width halves every step, so iteration count is known upfront
+        width = right_end - left_end
+        if width > tolerance:
+            count = min(math.ceil(math.log2(width / tolerance)), self.max_bisect)
+        else:
+            count = 0
+
+        for _ in range(count):
+            mid_price = (left_end + right_end) / 2
+            mid_delta = self.calculate_pos_delta(mid_price)
+
+            if (mid_delta > 0) == (left_delta > 0):
+                left_end = mid_price
+                left_delta = mid_delta
             else:
-                self.balance_price = try_price
-                break
+                right_end = mid_price
+
+        if right_end - left_end > tolerance:
+            return self.bisect_balance_price_bits(left_end, right_end, left_delta, tolerance)
 
-            if right_end - left_end < pricetick * 2:
-                self.balance_price = (left_end + right_end) / 2
+        return (left_end + right_end) / 2
+
+    def bisect_balance_price_bits(
+        self,
+        left_end: float,
+        right_end: float,
+        left_delta: float,
+        tolerance: float
+    ) -> float:
+        """
+        Bisect on float64 bit pattern, which converges in at most 64 steps
+        regardless of bracket magnitude.
+        """
+        left_int = float_to_ordered_int(left_end)
+        right_int = float_to_ordered_int(right_end)
+
+        for _ in range(64):
+            if right_end - left_end < tolerance or right_int - left_int <= 1:
                 break
 
-        if self.offset_percent:
-            self.up_price = self.balance_price * (1 + self.offset_percent)
-            self.down_price = self.balance_price * (1 - self.offset_percent)
+            mid_int = (left_int + right_int) >> 1
+            mid_price = ordered_int_to_float(mid_int)
+            mid_delta = self.calculate_pos_delta(mid_price)
+
+            if (mid_delta > 0) == (left_delta > 0):
+                left_int = mid_int
+                left_end = mid_price
+                left_delta = mid_delta
+            else:
+                right_int = mid_int
+                right_end = mid_price
+
+        return (left_end + right_end) / 2
+
+    def calculate_balance_price(self) -> Optional[float]:
+        """
+        Search balance price by bracketed bisection method.
+        """
+        if not self.chain.net_pos:
+            return
+
+        price = self.underlying.mid_price
+        if not price:
+            return
+
+        if not self.update_impv_array():
+            return
+
+        delta = self.calculate_pos_delta(price)
+
+        if delta:
+            bracket = self.search_bracket(price, delta)
+            if not bracket:
+                self.write_log(f"期权链{self.chain_symbol}未找到Delta中性价格区间")
+                return
+
+            left_end, right_end, left_delta = bracket
+            balance_price = self.bisect_balance_price(
+                left_end,
+                right_end,
+                left_delta,
+                price * self.price_tolerance
+            )
+            self.balance_price = balance_price
+        else:
+            self.balance_price = price
+
+        self.update_thresholds()
 
         self.put_hedge_algo_status_event(self)
+        return self.balance_price
+
+    def update_parameters(self, params: Dict) -> None:
+        """
+        Store parameters as plain floats for the hedge check.
+        """
+        for param_name in self.parameters:
+            if param_name in params:
+                value = float(params[param_name])
+                setattr(self, param_name, value)
+
+        self.up_factor = 1 + self.offset_percent
+        self.down_factor = 1 - self.offset_percent
+        self.update_thresholds()
+
+    def update_thresholds(self) -> None:
+        """
+        Update up and down price from balance price, thresholds are
+        cleared without offset so that no hedge is triggered.
+        """
+        if self.offset_percent:
+            self.up_price = self.balance_price * self.up_factor
+            self.down_price = self.balance_price * self.down_factor
+        else:
+            self.up_price = 0.0
+            self.down_price = 0.0
 
     def start_auto_hedge(self, params: Dict) -> None:
         if self.is_active():
@@ -793,10 +1203,7 @@ class ChannelHedgeAlgo:
         if not self.chain.net_pos:
             return
 
-        for param_name in self.parameters:
-            if param_name in params:
-                value = params[param_name]
-                setattr(self, param_name, value)
+        self.update_parameters(params)
 
         self.status = HedgeStatus.RUNNING
         self.put_hedge_algo_status_event(self)
@@ -807,14 +1214,16 @@ class ChannelHedgeAlgo:
             return
 
         self.status = HedgeStatus.NOTSTART
+        self.atm_index = ""
+        self.atm_options = None
         self.put_hedge_algo_status_event(self)
         self.write_log(f"期权链{self.chain_symbol}自动对冲已停止")
 
     def action_hedge(self, direction: Direction) -> None:
         atm_call, atm_put = self.get_synthesis_atm()
-        to_hedge_volume = self.calculate_hedge_volume()
+        to_hedge_volume = self.calculate_hedge_volume(atm_call, atm_put)
         if not to_hedge_volume:
-            self.write_log(f"期权链{self.chain_symbol} Delta偏移量少于最小对冲单元值")
+            self.write_log(f"期权链{self.chain_symbol} Delta偏移量少于最小对冲单元值", throttle=True)
             return
 
         if direction == Direction.LONG:
@@ -849,32 +1258,19 @@ class ChannelHedgeAlgo:
             return False
 
         if self.is_hedging():
-            print('algo is hedgeing')
+            self.write_debug(lambda: f"期权链{self.chain_symbol}正在对冲中")
             return False
 
         if not self.balance_price or not self.up_price or not self.down_price:
-            print('up and down is not ready')
+            self.write_debug(lambda: f"期权链{self.chain_symbol}上下阈值尚未计算")
             return False
 
         if not self.chain.atm_index:
-            print('atm index is not ready')
+            self.write_debug(lambda: f"期权链{self.chain_symbol}平值期权尚未确定")
             return False
 
         return True
 
-    def check_hedge_signal(self) -> None:
-        if not self.is_hedge_inited():
-            return
-        
-        tick = self.underlying.tick
-        # print('check_hedge_signal', tick.last_price, self.up_price)
-        if tick.last_price > self.up_price:
-            self.action_hedge(Direction.LONG)
-        elif tick.last_price < self.down_price:
-            self.action_hedge(Direction.SHORT)
-        else:
-            return
-
     def manual_hedge(self) -> None:
         if not self.is_hedge_inited():
             return
@@ -900,7 +1296,6 @@ class StrategyTrader:
         self.max_resend: int = 3
 
         self.orderid_to_strategyid: Dict[str, str] = {}
-        self.active_orderids: Set[str] = set()
         self.strategy_orders: Dict[str, OptionStrategyOrder] = {}
         self.cancel_counts: Dict[str, int] = {}
         
@@ -917,22 +1312,23 @@ class StrategyTrader:
         order: OrderData = event.data
         vt_orderid = order.vt_orderid
 
-        if vt_orderid not in self.active_orderids:
+        # order is active as long as it has a cancel count
+        if vt_orderid not in self.cancel_counts:
             return
 
         if not order.is_active():
             strategy_id = self.orderid_to_strategyid[vt_orderid]
             strategy_order = self.strategy_orders[strategy_id]
-            strategy_order.active_orderids.remove(vt_orderid)
+            strategy_order.active_orderids.discard(vt_orderid)
 
-            self.active_orderids.remove(vt_orderid)
-            self.cancel_counts.pop(vt_orderid, None)
+            self.cancel_counts.pop(vt_orderid)
 
         if order.status == Status.CANCELLED:
             self.resend_order(order)
 
     def process_timer_event(self, event: Event) -> None:
         self.chase_order()
+        self.check_cancel()
         self.send_order()
 
     def resend_order(self, order: OrderData) -> None:
@@ -955,17 +1351,33 @@ class StrategyTrader:
         )
         new_req.price = self.get_default_order_price(new_req.vt_symbol, new_req.direction)
         vt_orderid = self.main_engine.send_order(new_req, order.gateway_name)
+        self.register_orders(strategy_order, [vt_orderid], parent_id)
 
-        strategy_order.active_orderids.add(vt_orderid)
-        self.active_orderids.add(vt_orderid)
-        self.orderid_to_strategyid[vt_orderid] = strategy_id
-        self.cancel_counts[vt_orderid] = 0
-        
-        self.child_orders[parent_id].add(vt_orderid)
-        self.orderid_to_parentid[vt_orderid] = parent_id
+    def register_orders(
+        self,
+        strategy_order: OptionStrategyOrder,
+        vt_orderids: List[str],
+        parent_id: str = ""
+    ) -> None:
+        """
+        Register sent orders of strategy order, empty ids of failed sends are skipped.
+        Each order is its own parent unless parent_id is given.
+        """
+        vt_orderids = [vt_orderid for vt_orderid in vt_orderids if vt_orderid]
+        strategy_order.active_orderids.update(vt_orderids)
+
+        for vt_orderid in vt_orderids:
+            self.orderid_to_strategyid[vt_orderid] = strategy_order.strategy_id
+            self.cancel_counts[vt_orderid] = 0
 
-    def cancel_order(self, vt_orderid: str) -> None:
-        order = self.main_engine.get_order(vt_orderid)
+            if parent_id:
+                self.child_orders[parent_id].add(vt_orderid)
+                self.orderid_to_parentid[vt_orderid] = parent_id
+            else:
+                self.child_orders[vt_orderid] = {vt_orderid}
+                self.orderid_to_parentid[vt_orderid] = vt_orderid
+
+    def cancel_order(self, order: OrderData) -> None:
         req = order.create_cancel_request()
         self.main_engine.cancel_order(req, order.gateway_name)
 
@@ -974,24 +1386,28 @@ class StrategyTrader:
             if not strategy_order.is_active():
                 continue
 
-            active_orders = strategy_order.active_orderids
-            if not active_orders and not strategy_order.reqs:
+            if not strategy_order.active_orderids and not strategy_order.reqs:
                 strategy_order.status = StrategyOrderStatus.FINISHED
                 self.put_stategy_order_event(strategy_order)
-            else:
-                for vt_orderid in active_orders:
-                    if self.cancel_counts[vt_orderid] > self.cancel_interval:
-                        print('cancel order:', vt_orderid, self.cancel_counts[vt_orderid])
-                        order = self.main_engine.get_order(vt_orderid)
-                        if not self.is_contract_break(order.vt_symbol):
-                            self.cancel_counts[vt_orderid] = 0
-                            self.cancel_order(vt_orderid)
-                        else:
-                            self.cancel_counts[vt_orderid] = 0
-                    self.cancel_counts[vt_orderid] += 1
+
+    def check_cancel(self) -> None:
+        # iterate on snapshot since cancel_counts may change during callbacks
+        for vt_orderid, count in list(self.cancel_counts.items()):
+            if count > self.cancel_interval:
+                count = 0
+
+                order = self.main_engine.get_order(vt_orderid)
+                # order not known by main engine yet, retry on next tick
+                if not order:
+                    continue
+
+                if not self.is_contract_break(order.vt_symbol):
+                    self.cancel_order(order)
+
+            self.cancel_counts[vt_orderid] = count + 1
 
     def send_order(self) -> None:
-        for strategy_id, strategy_order in self.strategy_orders.items():
+        for strategy_order in self.strategy_orders.values():
             if strategy_order.is_finished():
                 continue
 
@@ -1000,26 +1416,21 @@ class StrategyTrader:
 
             reqs = strategy_order.reqs
             while reqs:
-                print('every req sending..')
                 req = reqs.pop()
 
                 contract = self.main_engine.get_contract(req.vt_symbol)
                 if not req.price:
                     req.price = self.get_default_order_price(req.vt_symbol, req.direction)
 
-                split_req_list = self.split_req(req)
-                for split_req in split_req_list:
-                    vt_orderid = self.main_engine.send_order(split_req, contract.gateway_name)
-
-                    strategy_order.active_orderids.add(vt_orderid)
-                    self.active_orderids.add(vt_orderid)
-                    self.orderid_to_strategyid[vt_orderid] = strategy_id
-                    self.cancel_counts[vt_orderid] = 0
+                # common case, no need to split
+                if req.volume <= self.max_volume:
+                    vt_orderid = self.main_engine.send_order(req, contract.gateway_name)
+                    self.register_orders(strategy_order, [vt_orderid])
+                    continue
 
-                    child_set = set()
-                    child_set.add(vt_orderid)
-                    self.child_orders[vt_orderid] = child_set
-                    self.orderid_to_parentid[vt_orderid] = vt_orderid
+                split_req_list = self.split_req(req)
+                vt_orderids = self.main_engine.send_orders(split_req_list, contract.gateway_name)
+                self.register_orders(strategy_order, vt_orderids)
 
             if not strategy_order.is_active():
                 strategy_order.status = StrategyOrderStatus.SENDED
@@ -1048,14 +1459,11 @@ class StrategyTrader:
         return not tick.ask_price_2 and not tick.bid_price_2
 
     def split_req(self, req: OrderRequest):
-        if req.volume <= self.max_volume:
-            return [req]
-
         max_count, remainder = divmod(req.volume, self.max_volume)
 
         req_max = copy(req)
         req_max.volume = self.max_volume
-        req_list = [req_max for i in range(int(max_count))]
+        req_list = [copy(req_max) for _ in range(int(max_count))]
 
         if remainder:
             req_r = copy(req)
@@ -1123,11 +1531,11 @@ class MarginCaculator:
 
     def get_margin(self, vt_symbol: str):
         margin = self.margins.get(vt_symbol)
-        if not margin:
+        if margin is None:
             option = self.option_engine.instruments.get(vt_symbol)
             margin = self.calculate_etf_margin(option)
             self.margins[vt_symbol] = margin
-            return margin
+        return margin
 
     def calculate_etf_margin(self, option: OptionData):
         option_pre_close = option.tick.pre_close
@@ -0,0 +1,30 @@
+import math
+
+import numpy as np
+from numba import njit, prange
+
+SQRT_HALF = 0.7071067811865476
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def calculate_pos_delta(
+    s: float,
+    k: np.ndarray,
+    b: np.ndarray,
+    t: np.ndarray,
+    v: np.ndarray,
+    cp: np.ndarray,
+    delta_size: np.ndarray
+) -> float:
+    """
+    Calculate pos delta of option arrays in one fused pass.
+
+    b is cost of carry (r for Black-Scholes, 0 for Black-76), and
+    delta_size is pos size already weighted by exp((b - r) * t).
+    """
+    acc = 0.0
+    for i in prange(k.shape[0]):
+        d1 = (math.log(s / k[i]) + (b[i] + 0.5 * v[i] * v[i]) * t[i]) / (v[i] * math.sqrt(t[i]))
+        cdf = 0.5 * (1.0 + math.erf(cp[i] * d1 * SQRT_HALF))
+        acc += cp[i] * cdf * delta_size[i]
+    return acc * s * 0.01
@@ -101,25 +101,19 @@ class HedgeManager(QtWidgets.QWidget):
         super().showMaximized()
 
     def start_for_all(self) -> None:
-        for chain_symbol in self.hedge_monitor.cells.keys():
+        for chain_symbol in self.hedge_monitor.chain_symbols:
             self.hedge_monitor.start_auto_hedge(chain_symbol)
 
     def stop_for_all(self) -> None:
         self.hedge_engine.stop_all_auto_hedge()
 
     def set_offset_percent(self) -> None:
-        offset_percent = self.offset_percent.get_display_value()
-
-        for cells in self.hedge_monitor.cells.values():
-            if cells['offset_percent'].isEnabled():
-                cells['offset_percent'].setValue(offset_percent)
+        offset_percent = self.offset_percent.get_real_value()
+        self.hedge_monitor.set_parameter('offset_percent', offset_percent)
 
     def set_hedge_percent(self) -> None:
-        hedge_percent = self.hedge_percent.get_display_value()
-
-        for cells in self.hedge_monitor.cells.values():
-            if cells['hedge_percent'].isEnabled():
-                cells['hedge_percent'].setValue(hedge_percent)
+        hedge_percent = self.hedge_percent.get_real_value()
+        self.hedge_monitor.set_parameter('hedge_percent', hedge_percent)
 
     def close(self) -> None:
         self.hedge_engine.save_setting()
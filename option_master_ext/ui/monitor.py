@@ -1,4 +1,6 @@
-from typing import List, Dict
+from typing import List, Dict, Mapping
+from types import MappingProxyType
+from functools import partial
 
 from vnpy.event import EventEngine, Event
 from vnpy.trader.ui import QtWidgets, QtCore, QtGui
@@ -6,8 +8,7 @@ from vnpy.trader.ui.widget import BaseCell, DirectionCell, EnumCell, BaseMonitor
 
 from vnpy.app.option_master.base import ChainData
 from vnpy.app.option_master.ui.manager import AlgoSpinBox, AlgoDoubleSpinBox
-from vnpy.app.option_master.ui.monitor import MonitorCell, PosCell, GreeksCell
-
+from vnpy.app.option_master.ui.monitor import COLOR_POS, COLOR_GREEKS
 
 from ..engine_ext import (
     EVENT_OPTION_STRATEGY_ORDER, EVENT_OPTION_HEDGE_ALGO_STATUS,
@@ -68,6 +69,9 @@ class HedgePercentSpinBox(AlgoSpinBox):
     def get_real_value(self) -> float:
         return self.value() / 100
 
+    def set_real_value(self, value: float) -> None:
+        self.setValue(int(round(value * 100)))
+
     def get_display_value(self) -> int:
         return self.value()
 
@@ -85,6 +89,9 @@ class OffsetPercentSpinBox(AlgoDoubleSpinBox):
     def get_real_value(self) -> float:
         return self.value() / 100
 
+    def set_real_value(self, value: float) -> None:
+        self.setValue(value * 100)
+
     def get_display_value(self) -> float:
         return self.value()
 
@@ -111,21 +118,96 @@ class StrategyOrderMonitor(BaseMonitor):
         self.resize_columns()
 
 
-class HedgeMonitor(QtWidgets.QTableWidget):
+class HedgeTableModel(QtCore.QAbstractTableModel):
+
+    def __init__(
+        self,
+        hedge_engine: HedgeEngine,
+        chains: Mapping[str, ChainData],
+        headers: List[Dict],
+        chain_symbols: List[str]
+    ):
+        super().__init__()
+
+        self.hedge_engine: HedgeEngine = hedge_engine
+        self.chains: Mapping[str, ChainData] = chains
+        self.headers: List[Dict] = headers
+        self.chain_symbols: List[str] = chain_symbols
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.chain_symbols)
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation, role: int = QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]["display"]
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        chain_symbol = self.chain_symbols[index.row()]
+        name = self.headers[index.column()]["name"]
+
+        if role == QtCore.Qt.DisplayRole:
+            return self.get_text(chain_symbol, name)
+        elif role == QtCore.Qt.TextAlignmentRole:
+            return QtCore.Qt.AlignCenter
+        elif role == QtCore.Qt.ForegroundRole:
+            return self.get_color(chain_symbol, name)
+        return None
+
+    def get_text(self, chain_symbol: str, name: str) -> str:
+        algo = self.hedge_engine.hedge_algos[chain_symbol]
+
+        if name == "chain_symbol":
+            return chain_symbol
+        elif name in ["balance_price", "up_price", "down_price"]:
+            return f"{getattr(algo, name):0.3f}"
+        elif name == "pos_delta":
+            return f"{self.chains[chain_symbol].pos_delta:0.0f}"
+        elif name == "net_pos":
+            return str(self.chains[chain_symbol].net_pos)
+        elif name == "status":
+            return algo.status.value
+        return None
+
+    def get_color(self, chain_symbol: str, name: str) -> QtGui.QColor:
+        # same colors as GreeksCell and PosCell of option master
+        if name == "pos_delta":
+            return COLOR_GREEKS
+        elif name == "net_pos":
+            return COLOR_POS
+        return None
+
+    def update_row(self, row: int) -> None:
+        top_left = self.index(row, 0)
+        bottom_right = self.index(row, len(self.headers) - 1)
+        self.dataChanged.emit(top_left, bottom_right)
+
+
+class HedgeMonitor(QtWidgets.QTableView):
     signal_status = QtCore.pyqtSignal(Event)
 
     headers: List[Dict] = [
-        {"name": "chain_symbol", "display": "期权链", "cell": MonitorCell},
-        {"name": "balance_price", "display": "中性基准价", "cell": MonitorCell},
-        {"name": "up_price", "display": "上阈值", "cell": MonitorCell},
-        {"name": "down_price", "display": "下阈值", "cell": MonitorCell},
-        {"name": "pos_delta", "display": "Delta", "cell": GreeksCell},
-        {"name": "net_pos", "display": "组合净仓", "cell": PosCell},
-        {"name": "offset_percent", "display": "偏移比例", "cell": OffsetPercentSpinBox},
-        {"name": "hedge_percent", "display": "对冲比例", "cell": HedgePercentSpinBox},
-        {"name": "status", "display": "状态", "cell": MonitorCell},
-        {"name": "auto_hedge", "display": "监测开关", "cell": HedgeAutoButton},
-        {"name": "action_hedge", "display": "对冲", "cell": HedgeActionButton},
+        {"name": "chain_symbol", "display": "期权链"},
+        {"name": "balance_price", "display": "中性基准价"},
+        {"name": "up_price", "display": "上阈值"},
+        {"name": "down_price", "display": "下阈值"},
+        {"name": "pos_delta", "display": "Delta"},
+        {"name": "net_pos", "display": "组合净仓"},
+        {"name": "offset_percent", "display": "偏移比例", "widget": OffsetPercentSpinBox},
+        {"name": "hedge_percent", "display": "对冲比例", "widget": HedgePercentSpinBox},
+        {"name": "status", "display": "状态"},
+        {"name": "auto_hedge", "display": "监测开关", "widget": HedgeAutoButton},
+        {"name": "action_hedge", "display": "对冲", "widget": HedgeActionButton},
     ]
 
     def __init__(self, option_engine: OptionEngineExt):
@@ -134,9 +216,15 @@ class HedgeMonitor(QtWidgets.QTableWidget):
         self.option_engine: OptionEngineExt = option_engine
         self.event_engine: EventEngine = option_engine.event_engine
         self.hedge_engine: HedgeEngine = self.option_engine.hedge_engine
-        
-        self.chains: Dict[str, ChainData] = self.hedge_engine.chains
-        self.cells: Dict[str, Dict] = {}
+
+        self.chains: Mapping[str, ChainData] = MappingProxyType(self.hedge_engine.chains)
+        self.chain_symbols: List[str] = list(self.chains.keys())
+        self.rows: Dict[str, int] = {}
+        self.params: Dict[str, Dict[str, float]] = {}
+        self.widgets: Dict[str, Dict[str, QtWidgets.QWidget]] = {}
+
+        self.update_interval: int = 50
+        self.pending_algos: Dict[str, ChannelHedgeAlgo] = {}
 
         self.init_ui()
         self.register_event()
@@ -146,87 +234,158 @@ class HedgeMonitor(QtWidgets.QTableWidget):
         self.verticalHeader().setVisible(False)
         self.setEditTriggers(self.NoEditTriggers)
 
-        chain_symbols = self.chains.keys()
-        self.setRowCount(len(chain_symbols))
-        self.setColumnCount(len(self.headers))
-
-        labels = [d["display"] for d in self.headers]
-        self.setHorizontalHeaderLabels(labels)
-
-        for row, chain_symbol in enumerate(chain_symbols):
-            chain_cells = {}
-            for column, d in enumerate(self.headers):
-                cell_type  = d['cell']
-                cell_name = d['name']
-
-                if cell_name in ['auto_hedge', 'action_hedge']:
-                    cell = cell_type(chain_symbol, self)
-                else:
-                    cell = cell_type()
-
-                if isinstance(cell, QtWidgets.QTableWidgetItem):
-                    self.setItem(row, column, cell)
-                else:
-                    self.setCellWidget(row, column, cell)
-
-                chain_cells[cell_name] = cell
-            
-            self.cells[chain_symbol] = chain_cells
+        self.table_model = HedgeTableModel(
+            self.hedge_engine,
+            self.chains,
+            self.headers,
+            self.chain_symbols
+        )
+        self.setModel(self.table_model)
+
+        # clamp initial parameters into spin box range as widgets would do
+        spin_boxes = {
+            "offset_percent": OffsetPercentSpinBox(),
+            "hedge_percent": HedgePercentSpinBox(),
+        }
+
+        for row, chain_symbol in enumerate(self.chain_symbols):
+            algo = self.hedge_engine.hedge_algos[chain_symbol]
+            self.rows[chain_symbol] = row
+
+            params = {}
+            for name, spin_box in spin_boxes.items():
+                spin_box.set_real_value(getattr(algo, name))
+                params[name] = spin_box.get_real_value()
+            self.params[chain_symbol] = params
+
+        # editor widgets are only created for rows scrolled into view
+        self.verticalScrollBar().valueChanged.connect(self.create_visible_widgets)
 
         self.resizeColumnsToContents()
 
-        for chain_symbol in self.cells:
-            algo = self.hedge_engine.hedge_algos.get(chain_symbol)
-            self.update_algo_status(algo)
-            self.update_chain_attr(chain_symbol, 'chain_symbol')
-            self.update_chain_attr(chain_symbol, 'net_pos')
-            self.update_chain_attr(chain_symbol, 'pos_delta')
-
     def register_event(self) -> None:
         self.signal_status.connect(self.process_status_event)
         self.event_engine.register(EVENT_OPTION_HEDGE_ALGO_STATUS, self.signal_status.emit)
 
+    def showEvent(self, event: QtGui.QShowEvent) -> None:
+        super().showEvent(event)
+        self.create_visible_widgets()
+
+    def resizeEvent(self, event: QtGui.QResizeEvent) -> None:
+        super().resizeEvent(event)
+        self.create_visible_widgets()
+
+    def create_visible_widgets(self) -> None:
+        first_row = self.rowAt(0)
+        if first_row < 0:
+            return
+
+        last_row = self.rowAt(self.viewport().height() - 1)
+        if last_row < 0:
+            last_row = len(self.chain_symbols) - 1
+
+        for row in range(first_row, last_row + 1):
+            chain_symbol = self.chain_symbols[row]
+            if chain_symbol not in self.widgets:
+                self.create_row_widgets(row, chain_symbol)
+
+    def create_row_widgets(self, row: int, chain_symbol: str) -> None:
+        row_widgets = {}
+        for column, d in enumerate(self.headers):
+            widget_type = d.get("widget")
+            if not widget_type:
+                continue
+
+            name = d["name"]
+            if name in ["auto_hedge", "action_hedge"]:
+                widget = widget_type(chain_symbol, self)
+            else:
+                widget = widget_type()
+                widget.set_real_value(self.params[chain_symbol][name])
+                widget.valueChanged.connect(partial(self.update_param, chain_symbol, name))
+
+            self.setIndexWidget(self.table_model.index(row, column), widget)
+            row_widgets[name] = widget
+
+            # columns may be sized before any editor exists
+            width = widget.sizeHint().width()
+            if self.columnWidth(column) < width:
+                self.setColumnWidth(column, width)
+
+        self.widgets[chain_symbol] = row_widgets
+        self.update_row_widgets(chain_symbol)
+
+    def update_row_widgets(self, chain_symbol: str) -> None:
+        row_widgets = self.widgets.get(chain_symbol)
+        if not row_widgets:
+            return
+
+        algo = self.hedge_engine.hedge_algos[chain_symbol]
+        active = algo.is_active()
+        params = self.params[chain_symbol]
+
+        row_widgets["auto_hedge"].update_status(active)
+        for name in ["offset_percent", "hedge_percent"]:
+            widget = row_widgets[name]
+            widget.set_real_value(params[name])
+            widget.update_status(active)
+
+    def update_param(self, chain_symbol: str, name: str, _value: float) -> None:
+        widget = self.widgets[chain_symbol][name]
+        self.params[chain_symbol][name] = widget.get_real_value()
+
+    def set_parameter(self, name: str, value: float) -> None:
+        """
+        Set parameter value for all chains which are not hedging.
+        """
+        for chain_symbol in self.chain_symbols:
+            algo = self.hedge_engine.hedge_algos[chain_symbol]
+            if algo.is_active():
+                continue
+
+            self.params[chain_symbol][name] = value
+
+            row_widgets = self.widgets.get(chain_symbol)
+            if row_widgets:
+                row_widgets[name].set_real_value(value)
+
     def process_status_event(self, event: Event) -> None:
+        """
+        Collect status events and update table once after an interval.
+        """
         algo = event.data
-        self.update_algo_status(algo)
-        
+        if not self.pending_algos:
+            QtCore.QTimer.singleShot(self.update_interval, self.process_pending_status)
+
+        self.pending_algos[algo.chain_symbol] = algo
+
+    def process_pending_status(self) -> None:
+        algos = list(self.pending_algos.values())
+        self.pending_algos.clear()
+
+        self.setUpdatesEnabled(False)
+        try:
+            for algo in algos:
+                self.update_algo_status(algo)
+        finally:
+            self.setUpdatesEnabled(True)
+            self.viewport().update()
+
     def update_algo_status(self, algo: ChannelHedgeAlgo):
-        cells = self.cells[algo.chain_symbol]
-
-        cells['status'].setText(algo.status.value)
-        cells['balance_price'].setText(f'{algo.balance_price:0.3f}')
-        cells['up_price'].setText(f'{algo.up_price:0.3f}')
-        cells['down_price'].setText(f'{algo.down_price:0.3f}')
-
-        print('update algo status:', algo.chain.net_pos, algo.chain.pos_delta)
-        cells['net_pos'].setText(str(algo.chain.net_pos))
-        cells['pos_delta'].setText(f'{algo.chain.pos_delta:0.0f}')
-        cells['auto_hedge'].update_status(algo.is_active())
-
-        cells['offset_percent'].setValue(algo.offset_percent * 100)
-        cells['hedge_percent'].setValue(int(algo.hedge_percent * 100))
-        cells['offset_percent'].update_status(algo.is_active())
-        cells['hedge_percent'].update_status(algo.is_active())
-
-    def update_chain_attr(self, chain_symbol: str, attr_name: str):
-        chain = self.chains.get(chain_symbol)
-        cells = self.cells[chain_symbol]
-
-        if attr_name in cells:
-            value = getattr(chain, attr_name, None)
-            if value is not None:
-                cells[attr_name].setText(str(value))
-    
-    def start_auto_hedge(self, chain_symbol) -> None:
-        cells = self.cells[chain_symbol]
-        params = {}
-        for name in ['offset_percent', 'hedge_percent']:
-            params[name] = cells[name].get_real_value()
+        chain_symbol = algo.chain_symbol
 
+        # parameters being edited are kept until algo is started
+        if algo.is_active():
+            params = self.params[chain_symbol]
+            params["offset_percent"] = algo.offset_percent
+            params["hedge_percent"] = algo.hedge_percent
+
+        self.table_model.update_row(self.rows[chain_symbol])
+        self.update_row_widgets(chain_symbol)
+
+    def start_auto_hedge(self, chain_symbol) -> None:
+        params = dict(self.params[chain_symbol])
         self.hedge_engine.start_hedge_algo(chain_symbol, params)
 
     def stop_auto_hedge(self, chain_symbol) -> None:
         self.hedge_engine.stop_hedge_algo(chain_symbol)
-
-
-